@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+# aggregate fields from the AdminComment JSON of many jobs
+#
+# The admincomment shell function runs one sacct per job and pipes it to jq,
+# which is far too slow for auditing thousands of jobs. This fetches the
+# AdminComment of a whole job set or time window with a single sacct query,
+# streams the records, skips anything that isn't valid JSON, and keeps only
+# running totals and a quantile sketch per group and field, so memory doesn't
+# grow with the number of jobs.
+#
+# usage:
+#   admincomment.py -f field[,field..] [-g user|account] [-p 50,90,99]
+#                   [-o table|json] [-j jobid,..] [-S start] [-E end]
+#                   [-- extra sacct options]
+# eg:
+#   admincomment.py -S 2024-01-01 -f stats.energy,stats.maxrss -g account
+#
+# fields are dotted paths into the JSON (eg "stats.energy"), and only numeric
+# values are aggregated. Output is a table, or with -o json one JSON object
+# per line for each group and field
+
+import sys
+
+import slurm_trace
+from quantile_sketch import QuantileSketch
+
+
+def sacct_args(jobs=None, start=None, end=None, extra=()):
+    args = ['sacct', '-a', '-X', '-n', '-P', '-o', 'JobID,User,Account,AdminComment']
+    if jobs:
+        args += ['-j', jobs]
+    if start:
+        args += ['-S', start]
+    if end:
+        args += ['-E', end]
+    return args + list(extra)
+
+
+def parse_records(lines):
+    """ generator over sacct -P lines of JobID|User|Account|AdminComment,
+        yielding (jobid, user, account, comment as a dict). Lines without a
+        JSON object in the AdminComment are skipped
+    """
+    import json
+    loads = json.loads
+    for line in lines:
+        # AdminComment is last, so a '|' within it doesn't matter:
+        fields = line.rstrip('\n').split('|', 3)
+        # fast path: most junk is an empty or non-JSON comment
+        if len(fields) < 4 or not fields[3].startswith('{'):
+            continue
+        try:
+            comment = loads(fields[3])
+        except ValueError:
+            continue
+        if isinstance(comment, dict):
+            yield fields[0], fields[1], fields[2], comment
+
+
+def get_field(d, path):
+    """ value at a dotted path like "stats.energy" in nested dicts, or None """
+    for key in path.split('.'):
+        if not isinstance(d, dict):
+            return None
+        d = d.get(key)
+    return d
+
+
+class Aggregate:
+    """ running count, sum, min, max and quantile sketch of one field """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch()
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.sketch.add(value)
+
+    def summary(self, percentiles=(50, 90)):
+        d = { 'count': self.count, 'sum': self.sum,
+              'mean': self.sum / self.count if self.count else None,
+              'min': self.min, 'max': self.max }
+        for p in percentiles:
+            d['p{:g}'.format(p)] = self.sketch.quantile(p / 100.0)
+        return d
+
+
+def aggregate(records, fields, group_by=None):
+    """ aggregate the numeric values of each field over the records from
+        parse_records. Returns {(group, field): Aggregate}, where group is the
+        user or account (if group_by is 'user' or 'account') or '*'
+    """
+    which = { None: None, 'user': 1, 'account': 2 }[group_by]
+    aggs = {}
+    for record in records:
+        group = record[which] if which else '*'
+        comment = record[3]
+        for field in fields:
+            value = get_field(comment, field)
+            # bools are ints in python, but not something to add up:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                agg = aggs.get((group, field))
+                if agg is None:
+                    agg = aggs[(group, field)] = Aggregate()
+                agg.add(value)
+    return aggs
+
+
+def main(argv):
+    import getopt
+    usage = ("usage: {} -f field[,field..] [-g user|account] [-p 50,90,99] [-o table|json]"
+             " [-j jobid,..] [-S start] [-E end] [-- extra sacct options]".format(argv[0]))
+    try:
+        opts, extra = getopt.getopt(argv[1:], 'f:g:p:o:j:S:E:h')
+    except getopt.GetoptError:
+        print(usage, file=sys.stderr)
+        return 2
+    opts = dict(opts)
+    if '-h' in opts or '-f' not in opts or opts.get('-g') not in (None, 'user', 'account') \
+            or opts.get('-o', 'table') not in ('table', 'json'):
+        print(usage, file=sys.stderr)
+        return 2
+    fields = [ f for f in opts['-f'].split(',') if f ]
+    try:
+        percentiles = [ float(p) for p in opts.get('-p', '50,90').split(',') if p ]
+    except ValueError:
+        percentiles = None
+    if not percentiles or not all(0 <= p <= 100 for p in percentiles):
+        print(usage, file=sys.stderr)
+        return 2
+
+    args = sacct_args(opts.get('-j'), opts.get('-S'), opts.get('-E'), extra)
+    aggs = aggregate(parse_records(slurm_trace.stream(args)), fields, opts.get('-g'))
+
+    rows = []
+    for (group, field) in sorted(aggs):
+        row = { 'group': group, 'field': field }
+        row.update(aggs[(group, field)].summary(percentiles))
+        rows.append(row)
+    if opts.get('-o') == 'json':
+        import json
+        for row in rows:
+            print(json.dumps(row))
+        return 0
+    columns = ['group', 'field', 'count', 'sum', 'mean', 'min', 'max']
+    columns += [ 'p{:g}'.format(p) for p in percentiles ]
+    fmt = lambda v: '{:.6g}'.format(v) if isinstance(v, float) else str(v)
+    table = [ columns ] + [ [ fmt(row[c]) for c in columns ] for row in rows ]
+    widths = [ max(len(line[i]) for line in table) for i in range(len(columns)) ]
+    for line in table:
+        print('  '.join(v.ljust(w) if i < 2 else v.rjust(w)
+                        for i, (v, w) in enumerate(zip(line, widths))))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -5,11 +5,54 @@ _slurm_helpers_defined=1
 
 alias scn=scontrol
 
+# where the python helpers live:
+_slurm_helpers_dir=$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)
+
+# optional helper daemon (slurm_helperd.py) that caches squeue/scontrol output
+# and answers nodelist/cname lookups. _shd returns non-zero if the daemon isn't
+# running or the request fails, so callers can fall back to running the slurm
+# command directly. With socat it talks to the socket itself, so a request
+# costs no python startup. Without it, only the slurm queries (which the daemon
+# saves an RPC on) go via a "python3 -S" client, the local lookups are cheaper
+# done directly:
+_shd () 
+{
+  local sock=${SLURM_HELPERD_SOCKET:-${XDG_RUNTIME_DIR:-/tmp}/slurm-helperd-$UID.sock}
+  [[ -S $sock && -O $sock ]] || return 2
+  if ! type -P socat >/dev/null ; then
+    case $1 in
+      squeue|res_*) python3 -S "$_slurm_helpers_dir/slurm_helperd.py" call "$@" 2>/dev/null ; return ;;
+      *) return 2 ;;
+    esac
+  fi
+  # the request is NUL-separated fields: the SLURM_* and SQUEUE_* environment,
+  # an empty field, then the command and its args (see slurm_helperd.call)
+  local v fields=()
+  for v in $(compgen -e) ; do
+    [[ $v == SLURM_* || $v == SQUEUE_* ]] && fields+=("$v=${!v}")
+  done
+  fields+=("" "$@")
+  # the reply is a status line then the output, the "." keeps its trailing
+  # newlines from being stripped:
+  local reply
+  reply=$( { printf '%s\0' "${fields[@]:0:${#fields[@]}-1}" ; printf '%s' "${fields[@]: -1}" ; } |
+           socat -t 60 - "UNIX-CONNECT:$sock" 2>/dev/null ; echo . )
+  [[ ${reply%%$'\n'*} == OK ]] || return 1
+  reply=${reply#*$'\n'}
+  printf '%s' "${reply%.}"
+}
+shd_start () { python3 "$_slurm_helpers_dir/slurm_helperd.py" start ; }
+shd_stop () { python3 -S "$_slurm_helpers_dir/slurm_helperd.py" stop ; }
+
 admincomment () { 
   local j=$2 ; shift; shift;
   echo sacct $* -X -n -P -o admincomment $* -j $j 
   sacct $* -X -n -P -o admincomment $* -j $j | jq ; }
 
+# aggregate AdminComment fields over many jobs with one sacct query, eg:
+#   admincomment_stats -S 2024-01-01 -f stats.energy -g account
+admincomment_stats () { python3 "$_slurm_helpers_dir/admincomment.py" "$@" ; }
+
 # utility function used by other things:
 # (this is here mostly in suport of nersc_hours)
 dhms_to_sec () 
@@ -64,15 +107,19 @@ nersc_hours ()
   local usage="calculate NERSC-hours for a completed job, or set of jobs,"$'\n'
   usage+="or a walltime and nodecount"$'\n'
   usage+="sets machine charge factor based on current NERSC_HOST ($NERSC_HOST)"$'\n'
-  usage+="Usage: $0 [-knl] [-prem] [-shared] <jobid1> <jobid2> ..."$'\n'
+  usage+="Usage: $0 [-knl] [-prem] [-shared] [-M cluster] <jobid1> <jobid2> ..."$'\n'
   usage+="Usage: $0 [-knl] [-prem] -n <nodecount> -t <walltime-in-d-hh:mm:ss>"$'\n'
   local mcf dhms 
   local unit=NNodes
   local qos_factor=1
   local nodes=0
   local walltime=0  # in d-hh:mm:ss
-  #[[ "$NERSC_HOST" == "edison" ]] && mcf=48 || mcf=80
-  [[ "$NERSC_HOST" == "edison" ]] && mcf=64 || mcf=140
+  local cluster=""  # slurm cluster (sacct -M), default is the local one
+  local host=$NERSC_HOST
+  # -M needs to be known before the charge factor is set:
+  [[ " $* " =~ " -M "([^ ]+) ]] && host=${BASH_REMATCH[1]}
+  #[[ "$host" == "edison" ]] && mcf=48 || mcf=80
+  [[ "$host" == "edison" ]] && mcf=64 || mcf=140
 
   if [[ $# -eq 0 ]]; then
     echo "$usage"
@@ -83,6 +130,8 @@ nersc_hours ()
     case $1 in 
       -h*) echo "$usage" ; return 1 ;;
       -m) mcf=$2 ; shift ;;
+      # a single cluster only, the charge factor depends on it:
+      -M) cluster=$2 ; [[ $cluster == *,* ]] && { echo "$usage" ; return 1 ; } ; shift ;;
       #-knl) mcf=96 ;;
       -knl) mcf=80 ;;
       -shared) unit=NCPUS ;; 
@@ -105,7 +154,7 @@ nersc_hours ()
     if [[ $jobid == "null" ]]; then
       local usage="$walltime|$nodes|"
     else
-      local usage=$(sacct --noconvert -a -n -X -p -o Elapsed,$unit -j $jobid)
+      local usage=$(sacct ${cluster:+-M $cluster} --noconvert -a -n -X -p -o Elapsed,$unit -j $jobid)
     fi
     usage=${usage%|}
     local dhms=${usage%%|*}
@@ -114,7 +163,7 @@ nersc_hours ()
 
     usage=$((count*sec*mcf*qos_factor))
     # modifications:
-    if [[ "$NERSC_HOST" == "edison" ]]; then
+    if [[ "$host" == "edison" ]]; then
       if [[ "$unit" == "NCPUS" ]]; then
         # charge is per core:
         usage=$((usage/24))
@@ -199,16 +248,26 @@ partitions () { sinfo -O "partition,available:6,time:.12,nodes:.6" ; }
 res_compact_nodelist() 
 {
     resname=$1
+    _shd res_compact_nodelist "$resname" && return
     scontrol --oneliner show res=$resname | cut -d ' ' -f 5 | cut -d '=' -f 2
 }
 
 res_nodelist() 
 {
     resname=$1
+    _shd res_nodelist "$resname" && return
     compact_list=$(res_compact_nodelist "$resname")
     scontrol show hostname $compact_list
 }
 
+# nodelist like nid[00010-00012] to one node per line, and back again:
+nodelist_expand () { _shd expand "$@" || scontrol show hostnames "$@" ; }
+nodelist_compress () { _shd compress "$@" || scontrol show hostlist "$(tr ' ' ',' <<< "$*")" ; }
+
+# Cray XC cname (eg c0-0c0s1n1) for a nodename, or nodename for a cname:
+cname () { _shd cname "$@" || python3 "$_slurm_helpers_dir/slurm_helperd.py" run cname "$@" ; }
+cname_to_nodename () { _shd nodename "$@" || python3 "$_slurm_helpers_dir/slurm_helperd.py" run nodename "$@" ; }
+
 res_get_modes() 
 {
     resname=$1
@@ -306,6 +365,18 @@ function body ()
 #    #body sort -sn -k1,2 <<< "$wholeq" | cut -c2- | pager
 #  fi 
 #}
+
+# filter for the long display, replacing the start time of pending jobs with
+# predicted waits (field numbers match the long format in myq). If python
+# fails, the queue is passed through unchanged:
+_myq_estimate () 
+{
+  local in out
+  in=$(cat) ; [[ -n $in ]] || return 0
+  out=$(python3 "$_slurm_helpers_dir/waittime.py" annotate --state 2 --qos 3 --partition 4 --nodes 8 --submit 12 --start 13 <<< "$in" 2>/dev/null) && [[ -n $out ]] || out=$in
+  printf '%s\n' "$out"
+}
+
 # short display:  Q_pos  Jobid  State  Partition User Name  Nodes TimeLeft  Priority  Reason  (need to capture priority and state for sorting too)
 # long display:   Q_pos  Jobid  State  Partition QOS User  Account  Name  Nodes CPUs TimeLimit  TimeLeft  Submittime Starttime Priority  Reason
 function myq () 
@@ -313,6 +384,7 @@ function myq ()
   local grepargs=""
   local user=$USER
   local addfields=""
+  local estimate=cat  # filter to add predicted wait times to pending jobs
   #local fields='%.18i %.4t %10P %8u %20j %.6D %.10L %.10Q %.12r'
   #local pf=8  # priority field
   local timef='function dhms(ss) { if (ss<0) { sign="-"; s=-ss } else { sign="" ; s=ss }; d=int(s/86400); s=s-(d*86400) ; h=int(s/3600) ;s=s-(3600*h) ; m=int(s/60) ;s=s-(m*60) ; return sprintf("%s%dd-%02d:%02d:%02d",sign,d,h,m,s);} BEGIN { t=systime() }'
@@ -334,7 +406,12 @@ function myq ()
     local fields='%.18i %.4t %8q %10P %8u %8a %20j %.6D %.6C %.10l %.10L %.20V %.20S %.10Q %.20r %.30E'
     local pf=14
     local rf=15 # reason field
-    local usetimef="qt=dhms(t-\$12); out=gensub (/[[:blank:]]+[^[:blank:]]+/, sprintf(\"%21s\",qt),12); if (\$13~/[0-9]+/) {st=dhms(\$13-t) } else if (\$NF~/Resources/ && t-\$12>180) {st=\">4d\"} else {st=\$13}; out=gensub (/[[:blank:]]+[^[:blank:]]+/, sprintf(\"%21s\",st), 13, out);"
+    # start times like ~1.5h/6.0h are p50/p90 predicted remaining waits from
+    # waittime.py (jobs that have already waited past p90 are shown as before):
+    local usetimef="qt=dhms(t-\$12); out=gensub (/[[:blank:]]+[^[:blank:]]+/, sprintf(\"%21s\",qt),12); if (\$13~/^[0-9]+$/) {st=dhms(\$13-t) } else if (\$13~/^~/) {st=\$13} else if (\$NF~/Resources/ && t-\$12>180) {st=\">4d\"} else {st=\$13}; out=gensub (/[[:blank:]]+[^[:blank:]]+/, sprintf(\"%21s\",st), 13, out);"
+    # predicted waits for pending jobs, if "waittime_update" has been run:
+    [[ -f ${SLURM_WAITTIME_FILE:-${XDG_CACHE_HOME:-$HOME/.cache}/slurm-helpers/waittime.json} ]] && 
+      estimate=_myq_estimate
   else
     local fields='%.18i %.4t %8q %8u %20j %.6D %.10L %.10Q %.12r'
     local pf=8  # priority field
@@ -345,7 +422,7 @@ function myq ()
   grepargs="$user $*" 
   local awkscr="$timef NR==1 { gsub(/SUBMIT_TIME/, \"TIME_QUEUED\") ; print } NR>1 { $usetimef print out | \"sort -rsn -k$pf\" }"
   #local wholeq=$(SLURM_TIME_FORMAT='%s' squeue -r -t PD,R -o "$fields" | awk "$awkscr" | awk 'BEGIN { spos=0 ; rpos=0 ; notready="" } NR == 1 { print "0    Q_pos " $0 ; next } $2=="R" { print "1        0 " $0; next } $NF~/Priority|Resources/ { line=$0 ; if ($3=="shared") { spos+=1 ; pos=spos } else {rpos+=1 ; pos=rpos } ; printf "2 %8d %s\n",pos,$0 ; next } { printf "3 %8s %s\n", "NotReady", $0 } ' | body sort -sn -k1,2 | cut -c2-)
-  local wholeq=$(SLURM_TIME_FORMAT='%s' squeue -r -t PD,R,CF,CG -o "$fields" | awk "$awkscr" | awk 'BEGIN { spos=0 ; rpos=0 ; notready="" } NR == 1 { print "0    Q_pos " $0 ; next } $2~/^[RC]/ { print "1        0 " $0; next } $'$rf'~/Priority|Resources|ReqNodeNotAvail/ { line=$0 ; if ($3=="shared") { spos+=1 ; pos=spos } else {rpos+=1 ; pos=rpos } ; printf "2 %8d %s\n",pos,$0 ; next } { printf "3 %8s %s\n", "NotReady", $0 } ')
+  local wholeq=$( { SLURM_TIME_FORMAT='%s' _shd squeue -r -t PD,R,CF,CG -o "$fields" || SLURM_TIME_FORMAT='%s' squeue -r -t PD,R,CF,CG -o "$fields" ; } | $estimate | awk "$awkscr" | awk 'BEGIN { spos=0 ; rpos=0 ; notready="" } NR == 1 { print "0    Q_pos " $0 ; next } $2~/^[RC]/ { print "1        0 " $0; next } $'$rf'~/Priority|Resources|ReqNodeNotAvail/ { line=$0 ; if ($3=="shared") { spos+=1 ; pos=spos } else {rpos+=1 ; pos=rpos } ; printf "2 %8d %s\n",pos,$0 ; next } { printf "3 %8s %s\n", "NotReady", $0 } ')
 
   grepargs=${grepargs## }
   if [[ ${#grepargs} -gt 0 ]]; then 
@@ -360,4 +437,8 @@ function myq ()
 }
 function showq () { myq -l -a $* ; }
 
+# collect recent queue wait times for myq's predicted start times (only reads
+# jobs started since the last update, so it's cheap to run eg daily from cron):
+waittime_update () { python3 "$_slurm_helpers_dir/waittime.py" update "$@" ; }
+
 #function showq () { myq -l -a $* ; }
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+# a small mergeable quantile sketch, used for streaming statistics over many
+# jobs (eg wait times in waittime.py) without keeping every value
+
+import math
+
+
+class QuantileSketch:
+    """ a mergeable quantile sketch with relative accuracy alpha (in the
+        style of DDSketch): values are counted in logarithmic buckets, so
+        any quantile is within a factor of (1 +/- alpha) of the true value,
+        and the size depends only on the range of values (a few hundred
+        buckets from seconds to months), not on how many were added
+    """
+    # values closer to 0 than this are counted as 0:
+    min_value = 1e-9
+
+    def __init__(self, alpha=0.02):
+        self.alpha = alpha
+        self._gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self._gamma)
+        self.zeros = 0      # count of values ~0 (eg jobs that started immediately)
+        self.buckets = {}   # key: count, where bucket key covers (gamma^(k-1), gamma^k]
+        self.negatives = {} # same, for the magnitude of negative values
+        self.count = 0
+
+    def add(self, value, n=1):
+        if abs(value) < self.min_value:
+            self.zeros += n
+        else:
+            store = self.buckets if value > 0 else self.negatives
+            key = int(math.ceil(math.log(abs(value)) / self._log_gamma))
+            store[key] = store.get(key, 0) + n
+        self.count += n
+
+    def merge(self, other):
+        if other.alpha != self.alpha:
+            raise ValueError("can only merge sketches with the same alpha")
+        self.zeros += other.zeros
+        for mine, theirs in ((self.buckets, other.buckets), (self.negatives, other.negatives)):
+            for key, n in theirs.items():
+                mine[key] = mine.get(key, 0) + n
+        self.count += other.count
+
+    def quantile(self, q):
+        """ estimated q-quantile (0 <= q <= 1), or None if empty """
+        if self.count == 0:
+            return None
+        # nearest-rank, ie the smallest value with at least q of all values <= it:
+        rank = max(0, math.ceil(q * self.count) - 1)
+        # walk the buckets from most negative to most positive:
+        order = [ (-1, k, self.negatives[k]) for k in sorted(self.negatives, reverse=True) ]
+        order += [ (0, 0, self.zeros) ]
+        order += [ (1, k, self.buckets[k]) for k in sorted(self.buckets) ]
+        seen = 0
+        for sign, key, n in order:
+            seen += n
+            if rank < seen:
+                break
+        # midpoint (in relative terms) of the bucket:
+        return sign * 2 * self._gamma**key / (self._gamma + 1) if sign else 0.0
+
+    def to_dict(self):
+        keys = sorted(self.buckets)
+        d = { 'alpha': self.alpha, 'zeros': self.zeros,
+              'keys': keys, 'counts': [ self.buckets[k] for k in keys ] }
+        if self.negatives:
+            keys = sorted(self.negatives)
+            d.update(negkeys=keys, negcounts=[ self.negatives[k] for k in keys ])
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        sketch = cls(d['alpha'])
+        sketch.zeros = d['zeros']
+        sketch.buckets = dict(zip(d['keys'], d['counts']))
+        sketch.negatives = dict(zip(d.get('negkeys', []), d.get('negcounts', [])))
+        sketch.count = sketch.zeros + sum(d['counts']) + sum(sketch.negatives.values())
+        return sketch
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+# optional per-user helper daemon for the shell functions in functions.sh
+#
+# Every call to eg myq or res_nodelist forks squeue/scontrol (each an RPC to
+# slurmctld) and, for the python helpers, a fresh interpreter. On a busy login
+# node that startup cost is often larger than the work itself. This daemon
+# listens on a unix socket, keeps recent squeue output and parsed reservation
+# info warm for a few seconds, and answers nodelist expand/compress and cname
+# lookups without any further forking.
+#
+# usage:
+#   slurm_helperd.py start|stop|status     manage the daemon
+#   slurm_helperd.py serve                 run the daemon in the foreground
+#   slurm_helperd.py call <cmd> [args..]   ask the daemon (exit 2 if not running)
+#   slurm_helperd.py run <cmd> [args..]    do the same work in-process, no daemon
+#
+# where <cmd> is one of the commands in Helper.commands. The shell functions
+# send requests with socat if they can, else use "call" via "python3 -S", and
+# fall back to the direct path if it fails, so the client side of this module
+# must stay cheap to import: only os, sys and socket at module level,
+# everything else is imported in the server code.
+
+import os
+import sys
+import socket
+
+# exit codes for "call":
+ERR_FAILED = 1       # daemon ran the command but it failed
+ERR_NOT_RUNNING = 2  # no daemon (or not ours) listening on the socket
+
+# environment variables that can change the output of slurm commands (eg
+# SLURM_CLUSTERS, SLURM_CONF, SQUEUE_FORMAT) are passed from the client to
+# the daemon with each request, and replace the daemon's own:
+_passed_env = ('SLURM_', 'SQUEUE_')
+
+
+def _slurm_env(environ=None):
+    environ = os.environ if environ is None else environ
+    return { k: v for k, v in environ.items() if k.startswith(_passed_env) }
+
+
+def socket_path():
+    """ per-user socket, overridable via SLURM_HELPERD_SOCKET (the shell
+        functions compute the same default)
+    """
+    path = os.environ.get('SLURM_HELPERD_SOCKET')
+    if not path:
+        rundir = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+        path = os.path.join(rundir, 'slurm-helperd-{:d}.sock'.format(os.getuid()))
+    return path
+
+
+def _connect(path):
+    """ return a socket connected to our daemon, or None """
+    try:
+        # don't talk to a socket someone else planted at our path:
+        if os.stat(path).st_uid != os.getuid():
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+    except OSError:
+        return None
+    return sock
+
+
+def _recv_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def call(cmd, args=(), path=None):
+    """ send a request to the daemon. Returns (status, text) where status is
+        0 for success, or one of ERR_FAILED, ERR_NOT_RUNNING
+
+        wire format: the request is NUL-separated fields, first any KEY=VALUE
+        environment entries, then an empty field, then the command and its
+        args. The reply is a status line ("OK" or "ERR <message>") followed
+        by the output
+    """
+    sock = _connect(path or socket_path())
+    if sock is None:
+        return ERR_NOT_RUNNING, ''
+    env = [ '{}={}'.format(k, v) for k, v in sorted(_slurm_env().items()) ]
+    fields = env + [''] + [cmd] + list(args)
+    try:
+        sock.sendall('\0'.join(fields).encode())
+        sock.shutdown(socket.SHUT_WR)
+        reply = _recv_all(sock).decode()
+    except OSError:
+        return ERR_NOT_RUNNING, ''
+    finally:
+        sock.close()
+    status, sep, text = reply.partition('\n')
+    if status == 'OK':
+        return 0, text
+    return ERR_FAILED, status[4:]
+
+
+# ---- server side ----
+
+class Helper:
+    """ the work the daemon does. Slurm queries are cached for ttl seconds,
+        keyed by their full command line and the client's SLURM_* and
+        SQUEUE_* environment, and concurrent requests for the same key share
+        a single slurm call. Expired entries are dropped whenever a new one
+        is added
+    """
+    commands = ('squeue', 'res_compact_nodelist', 'res_nodelist',
+                'expand', 'compress', 'cname', 'nodename', 'ping')
+
+    def __init__(self, ttl=10.0):
+        import threading
+        self.ttl = ttl
+        self._cache = {}    # key: (timestamp, output)
+        self._locks = {}    # key: lock held while refreshing that key
+        self._lock = threading.Lock()
+        self._cluster = None
+
+    def _cached(self, key, fetch):
+        import threading
+        import time
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            hit = self._cache.get(key)
+            if hit and time.time() - hit[0] < self.ttl:
+                return hit[1]
+            value = fetch()
+            now = time.time()
+            self._cache[key] = (now, value)
+        self._expire(now)
+        return value
+
+    def _expire(self, now):
+        """ drop expired entries (and their locks, unless a refresh is in
+            progress), so that one-off queries don't stay in memory for the
+            daemon's whole lifetime
+        """
+        with self._lock:
+            for key, (stamp, value) in list(self._cache.items()):
+                lock = self._locks.get(key)
+                if now - stamp >= self.ttl and not (lock and lock.locked()):
+                    del self._cache[key]
+                    self._locks.pop(key, None)
+            # locks left by fetches that failed:
+            for key, lock in list(self._locks.items()):
+                if key not in self._cache and not lock.locked():
+                    del self._locks[key]
+
+    def _slurm(self, args, env=None, parse=None):
+        """ run a slurm command with the client's slurm environment instead
+            of the daemon's own
+        """
+        import slurm_trace
+        fullenv = { k: v for k, v in os.environ.items() if not k.startswith(_passed_env) }
+        fullenv.update(env or {})
+        return slurm_trace.run(args, env=fullenv, parse=parse)
+
+    def _reservations(self, env=None):
+        """ parsed {name: compact nodelist} for all reservations """
+        env = env or {}
+        def parse(out):
+            res = {}
+            for line in out.splitlines():
+                d = dict(f.split('=', 1) for f in line.split() if '=' in f)
+                if 'ReservationName' in d:
+                    res[d['ReservationName']] = d.get('Nodes', '')
+            return res
+        fetch = lambda: self._slurm(['scontrol', '-a', '-o', 'show', 'res'], env, parse=parse)
+        return self._cached(('res', tuple(sorted(env.items()))), fetch)
+
+    def _get_cluster(self):
+        if self._cluster is None:
+            import slurm_utils
+            if os.environ.get('NERSC_HOST') == 'edison':
+                rows, rooms = 4, 4
+            else:  # cori
+                rows, rooms = 6, 6
+            self._cluster = slurm_utils.CrayXC(extents={'slot':4, 'cage':16,
+                                          'cab':3, 'group':2, 'row':rows, 'room':rooms})
+        return self._cluster
+
+    def run(self, cmd, args, env=None):
+        """ return the output text for a request, or raise an exception """
+        env = env or {}
+        if cmd == 'ping':
+            return 'pong\n'
+        elif cmd == 'squeue':
+            fullcmd = ['squeue'] + list(args)
+            key = (tuple(sorted(env.items())),) + tuple(fullcmd)
+            return self._cached(key, lambda: self._slurm(fullcmd, env))
+        elif cmd == 'res_compact_nodelist':
+            res = self._reservations(env)
+            return ''.join(res[r] + '\n' for r in args)
+        elif cmd == 'res_nodelist':
+            import slurm_utils
+            res = self._reservations(env)
+            nodes = []
+            for r in args:
+                nodes += slurm_utils.expand_nodelist(res[r], as_list=True)
+            return ''.join(n + '\n' for n in nodes)
+        elif cmd == 'expand':
+            # same output as "scontrol show hostnames":
+            import slurm_utils
+            nodes = []
+            for nlist in args:
+                nodes += slurm_utils.expand_nodelist(nlist, as_list=True)
+            return ''.join(n + '\n' for n in nodes)
+        elif cmd == 'compress':
+            # like "scontrol show hostlist", which also accepts nodelists:
+            import slurm_utils
+            nodes = slurm_utils.expand_nodelist(','.join(' '.join(args).split()), as_list=True)
+            return slurm_utils.compress_nodelist(nodes) + '\n'
+        elif cmd == 'cname':
+            cluster = self._get_cluster()
+            return ''.join(cluster.cname_from_nodename(n) + '\n' for n in args)
+        elif cmd == 'nodename':
+            cluster = self._get_cluster()
+            return ''.join(cluster.nodename_from_cname(c) + '\n' for c in args)
+        raise ValueError("unknown command: {}".format(cmd))
+
+
+def serve(path=None, ttl=10.0, idle_timeout=3600):
+    """ run the daemon in the foreground until idle for idle_timeout seconds
+        or asked to shut down
+    """
+    import socketserver
+    import threading
+    import time
+
+    path = path or socket_path()
+    helper = Helper(ttl=ttl)
+    last_active = [time.time()]
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            last_active[0] = time.time()
+            fields = _recv_all(self.request).decode().split('\0')
+            try:
+                sep = fields.index('')
+                env = dict(f.split('=', 1) for f in fields[:sep])
+                cmd, args = fields[sep+1], fields[sep+2:]
+                if cmd == 'shutdown':
+                    threading.Thread(target=server.shutdown).start()
+                    reply = 'OK\n'
+                else:
+                    reply = 'OK\n' + helper.run(cmd, args, env)
+            except Exception as e:
+                reply = 'ERR {}\n'.format(str(e).replace('\n', ' '))
+            self.request.sendall(reply.encode())
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    # clean up after a previous daemon that died without removing its socket:
+    if os.path.exists(path):
+        if _connect(path) is not None:
+            raise Exception("slurm_helperd already running on {}".format(path))
+        os.unlink(path)
+    old_umask = os.umask(0o077)
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(old_umask)
+
+    def watchdog():
+        while time.time() - last_active[0] < idle_timeout:
+            time.sleep(min(60, idle_timeout))
+        server.shutdown()
+    threading.Thread(target=watchdog, daemon=True).start()
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def start(path=None):
+    """ fork a detached daemon, return once its socket is accepting requests """
+    import time
+    path = path or socket_path()
+    if call('ping', path=path)[0] == 0:
+        return
+    if os.fork() == 0:
+        os.setsid()
+        if os.fork() != 0:
+            os._exit(0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        try:
+            serve(path)
+        finally:
+            os._exit(0)
+    for i in range(50):
+        if call('ping', path=path)[0] == 0:
+            return
+        time.sleep(0.1)
+    raise Exception("slurm_helperd did not start")
+
+
+def main(argv):
+    usage = "usage: {} start|stop|status|serve|call <cmd> [args..]|run <cmd> [args..]".format(argv[0])
+    if len(argv) < 2:
+        print(usage, file=sys.stderr)
+        return 2
+    action = argv[1]
+    if action == 'call' and len(argv) > 2:
+        status, text = call(argv[2], argv[3:])
+        if status == ERR_FAILED:
+            print(text, file=sys.stderr)
+        else:
+            sys.stdout.write(text)
+        return status
+    elif action == 'run' and len(argv) > 2:
+        sys.stdout.write(Helper().run(argv[2], argv[3:], _slurm_env()))
+        return 0
+    elif action == 'start':
+        start()
+        return 0
+    elif action == 'stop':
+        return call('shutdown')[0]
+    elif action == 'status':
+        status = call('ping')[0]
+        print("running on {}".format(socket_path()) if status == 0 else "not running")
+        return status
+    elif action == 'serve':
+        serve()
+        return 0
+    print(usage, file=sys.stderr)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# run a slurm query against several clusters at once
+#
+# slurm's own "-M a,b,c" contacts each cluster's controller in turn, so one
+# slow slurmctld holds up the whole view. fanout() instead runs the command
+# once per cluster (with "-M <cluster>") from a bounded thread pool, yields
+# each cluster's result as soon as it completes, and gives up on any cluster
+# that takes longer than the per-cluster timeout.
+#
+# usage:
+#   slurm_multi.py [-M cluster1,cluster2] [-t timeout] [-j workers] <command> [args..]
+# eg:
+#   slurm_multi.py -M perlmutter,muller squeue -u $USER
+#
+# clusters default to $SLURM_CLUSTERS, then $NERSC_HOST. Output lines are
+# prefixed with the cluster name, in whatever order the clusters answer
+
+import os
+import sys
+import subprocess
+
+import slurm_trace
+
+
+def default_clusters():
+    clusters = os.environ.get('SLURM_CLUSTERS') or os.environ.get('NERSC_HOST') or ''
+    return [ c for c in clusters.split(',') if c ]
+
+
+def cluster_args(args, cluster):
+    """ the command args with "-M cluster" inserted after the command name """
+    return list(args[:1]) + ['-M', cluster] + list(args[1:])
+
+
+def strip_cluster_banner(out):
+    """ squeue and sinfo print a "CLUSTER: name" line first when given -M """
+    if out.startswith('CLUSTER: '):
+        out = out.partition('\n')[2]
+    return out
+
+
+def fanout(args, clusters, timeout=30, max_workers=8, env=None, parse=None):
+    """ generator running the slurm command args against each cluster
+        concurrently, yielding (cluster, result, error) tuples as each
+        finishes. result is the output text (or parse(output)) and error is
+        None, or result is None and error is the exception (from the command
+        or from parse), eg subprocess.TimeoutExpired if the cluster took more
+        than timeout seconds to answer
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    def query(cluster):
+        out = slurm_trace.run(cluster_args(args, cluster), env=env, timeout=timeout)
+        out = strip_cluster_banner(out)
+        return parse(out) if parse else out
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(clusters)))) as pool:
+        futures = { pool.submit(query, c): c for c in clusters }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+
+def main(argv):
+    import getopt
+    usage = "usage: {} [-M cluster1,cluster2] [-t timeout] [-j workers] <command> [args..]".format(argv[0])
+    try:
+        # stop at the first non-option, the rest belongs to the slurm command:
+        opts, args = getopt.getopt(argv[1:], 'M:t:j:h')
+    except getopt.GetoptError:
+        print(usage, file=sys.stderr)
+        return 2
+    clusters = default_clusters()
+    timeout = 30
+    workers = 8
+    try:
+        for opt, val in opts:
+            if opt == '-M':
+                clusters = [ c for c in val.split(',') if c ]
+            elif opt == '-t':
+                timeout = float(val)
+            elif opt == '-j':
+                workers = int(val)
+            else:
+                raise ValueError(opt)
+    except ValueError:
+        print(usage, file=sys.stderr)
+        return 2
+    if not args or not clusters or not timeout > 0 or workers < 1:
+        print(usage, file=sys.stderr)
+        return 2
+
+    width = max(len(c) for c in clusters)
+    failed = 0
+    for cluster, out, err in fanout(args, clusters, timeout=timeout, max_workers=workers):
+        if err is not None:
+            failed += 1
+            if isinstance(err, subprocess.TimeoutExpired):
+                err = "timed out after {:g}s".format(timeout)
+            print("{}: {}".format(cluster, err), file=sys.stderr)
+            continue
+        sys.stdout.write(''.join('{:<{w}s} {}\n'.format(cluster, line, w=width)
+                                 for line in out.splitlines()))
+        sys.stdout.flush()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
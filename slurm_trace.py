@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+# run slurm commands with optional tracing
+#
+# When SLURM_HELPERS_TRACE is set, every command run via slurm_trace.run is
+# recorded with its wall time (and how much of that was spawning the process),
+# bytes read, number of records and time spent parsing the output. Records
+# are appended as JSON lines to the file named by SLURM_HELPERS_TRACE (or
+# written to stderr if it is "-"), and a per-command summary table is printed
+# to stderr on exit. When it is not set, run() is just a subprocess call.
+#
+# eg:  SLURM_HELPERS_TRACE=/tmp/trace.jsonl python3 xcmap.py -r myres
+
+import os
+import sys
+import subprocess
+
+_trace_to = os.environ.get('SLURM_HELPERS_TRACE')
+_records = []
+_lock = None
+
+
+def run(args, env=None, parse=None, timeout=None):
+    """ run a command like subprocess.check_output (returning text), and
+        if parse is given, return parse(output) instead. timeout is in
+        seconds, the command is killed and subprocess.TimeoutExpired raised
+        if it takes longer
+    """
+    if not _trace_to:
+        proc = subprocess.Popen(args, env=env, stdout=subprocess.PIPE,
+                                universal_newlines=True)
+        out = _communicate(proc, args, timeout)
+        return parse(out) if parse else out
+
+    import time
+    t0 = time.time()
+    proc = subprocess.Popen(args, env=env, stdout=subprocess.PIPE,
+                            universal_newlines=True)
+    t1 = time.time()
+    record = { 'cmd': os.path.basename(args[0]), 'args': list(args[1:]),
+               'start': t0, 'spawn': t1-t0, 'bytes': 0, 'records': 0,
+               'parse': 0.0, 'rc': None }
+    try:
+        out = _communicate(proc, args, timeout)
+        record['wall'] = time.time() - t0
+        record['rc'] = proc.returncode
+        record['bytes'] = len(out.encode())
+        if parse:
+            t2 = time.time()
+            result = parse(out)
+            record['parse'] = time.time() - t2
+            record['records'] = len(result) if hasattr(result, '__len__') else None
+        else:
+            result = out
+            record['records'] = out.count('\n')
+        return result
+    finally:
+        record.setdefault('wall', time.time() - t0)
+        record['rc'] = proc.returncode
+        _record(record)
+
+
+def stream(args, env=None):
+    """ generator over the output lines of a command, for outputs too big
+        to hold in memory. Parse time can't be separated from the command's
+        own time here, so when tracing, the wall time includes the caller's
+        processing of each line
+    """
+    import time
+    t0 = time.time()
+    proc = subprocess.Popen(args, env=env, stdout=subprocess.PIPE,
+                            universal_newlines=True)
+    record = { 'cmd': os.path.basename(args[0]), 'args': list(args[1:]),
+               'start': t0, 'spawn': time.time()-t0, 'bytes': 0, 'records': 0,
+               'parse': 0.0, 'rc': None }
+    nbytes = nlines = 0
+    try:
+        for line in proc.stdout:
+            nlines += 1
+            if _trace_to:
+                nbytes += len(line.encode())
+            yield line
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            # the caller stopped early:
+            proc.kill()
+        proc.wait()
+        if _trace_to:
+            record.update(wall=time.time()-t0, bytes=nbytes, records=nlines, rc=proc.returncode)
+            _record(record)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, args)
+
+
+def _communicate(proc, args, timeout):
+    try:
+        out, err = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        raise
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, args, output=out)
+    return out
+
+
+def _record(record):
+    global _lock
+    import json
+    import threading
+    if _lock is None:
+        _lock = threading.Lock()
+        import atexit
+        atexit.register(summary)
+    line = json.dumps(record) + '\n'
+    with _lock:
+        _records.append(record)
+        if _trace_to == '-':
+            sys.stderr.write(line)
+        else:
+            with open(_trace_to, 'a') as f:
+                f.write(line)
+
+
+def summary(out=None):
+    """ print a table of count, total wall/spawn/parse time, bytes and
+        records for each traced command
+    """
+    out = out or sys.stderr
+    if not _records:
+        return
+    totals = {}
+    for r in list(_records):
+        t = totals.setdefault(r['cmd'], [0, 0.0, 0.0, 0.0, 0, 0])
+        t[0] += 1
+        t[1] += r['wall']
+        t[2] += r['spawn']
+        t[3] += r['parse']
+        t[4] += r['bytes']
+        t[5] += r['records'] or 0
+    fmt = '{:<12s} {:>6} {:>10} {:>10} {:>10} {:>12} {:>10}\n'
+    out.write(fmt.format('command', 'calls', 'wall(s)', 'spawn(s)', 'parse(s)', 'bytes', 'records'))
+    for cmd in sorted(totals):
+        n, wall, spawn, parse, nbytes, nrec = totals[cmd]
+        out.write(fmt.format(cmd, n, '{:.3f}'.format(wall), '{:.3f}'.format(spawn),
+                             '{:.3f}'.format(parse), nbytes, nrec))
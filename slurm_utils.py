@@ -33,68 +33,99 @@ def nodelist_to_cnames(nlist: str):
     if _cluster is None:
         raise Exception("Need a cluster definition!")
     cnames = []
-    for name in expand_nodelist(nlist):
+    for nodename in expand_nodelist(nlist, as_list=True):
         cnames.append(_cluster.cname_from_nodename(nodename))
     return cnames
     
 
-    
-    
+# note: keep module-level imports to a minimum, the shell functions (and 
+# slurm_helperd) import this on the interactive path, so eg re is only 
+# imported when actually needed, and the tests are in test_slurm_utils.py
 
-import string
-import re
 def expand_nodelist(nlist: str, as_list=False) -> str:
     """ translate a nodelist like 'nid[02516-02575,02580-02635,02836]' into a 
-        list of explicitly-named nodes, eg 'nid02516 nid02517 ...'
+        list of explicitly-named nodes, eg 'nid02516 nid02517 ...'. Like 
+        "scontrol show hostnames", several comma-separated groups such as 
+        'nid[00001-00002],login01' are expanded in turn
     """
     nodes = []
     if nlist.count('[') != nlist.count(']'):
         raise Exception("Incomplete nodelist: {}".format(nlist))
-    prefix, sep0, nl = nlist.partition('[')
-    if sep0:
-        for component in nl.rstrip(']').split(','): 
-            first,sep1,last = component.partition('-')
-            width='0{:d}'.format(len(first))
-            if sep1:
-                nodes += [ '{0:s}{2:{1:s}d}'.format(prefix,width,i) 
-                            for i in range(int(first),int(last)+1) ]
-            else:
-                nodes += [ '{0:s}{2:{1:s}d}'.format(prefix,width,int(first)) ] 
-    else:
-        nodes += [ prefix ]
+    for group in _split_nodelist(nlist):
+        prefix, sep0, nl = group.partition('[')
+        if sep0:
+            for component in nl.rstrip(']').split(','): 
+                first,sep1,last = component.partition('-')
+                width='0{:d}'.format(len(first))
+                if sep1:
+                    nodes += [ '{0:s}{2:{1:s}d}'.format(prefix,width,i) 
+                                for i in range(int(first),int(last)+1) ]
+                else:
+                    nodes += [ '{0:s}{2:{1:s}d}'.format(prefix,width,int(first)) ] 
+        elif prefix:
+            nodes += [ prefix ]
     if as_list:
         return nodes
     else:
         return ' '.join(nodes)
 
-import unittest
-class TestExpandNodelist(unittest.TestCase):
-    
-    def test_expandnodelist(self):
-        # slightly arbitrary list of test cases:
-        nlist = 'nid02085'
-        self.assertEqual(expand_nodelist(nlist), 'nid02085')
-        nlist = 'nid00[200,222]'
-        self.assertEqual(expand_nodelist(nlist), 'nid00200 nid00222')
-        nlist = 'nid00[187-188]'
-        self.assertEqual(expand_nodelist(nlist), 'nid00187 nid00188')
-        nlist = 'nid00[189-191,193-195,200-203,208-229]'
-        self.assertEqual(len(expand_nodelist(nlist).split()), 32)
-        nlist = 'nid0[1299-1306,1309-1315,1317,1319-1334]'
-        self.assertEqual(len(expand_nodelist(nlist).split()), 32)
-        nlist = 'nid[10436-10439,10441-10443,10448-10452,10454-10511,10516-10535]'
-        self.assertEqual(len(expand_nodelist(nlist).split()), 90)
-        # incomplete nodelist should throw an exception:
-        nlist = 'nid[07575,08812,09507,09637,09946,10361,10436,109'
-        with self.assertRaises(Exception):
-            expand_nodelist(nlist)
-
-
-from operator import mul
-import re
-
-from typing import Dict
-DimsMap = Dict[str,int]
+def _split_nodelist(nlist: str):
+    """ split a nodelist at the commas that are not inside brackets """
+    groups = []
+    depth = start = 0
+    for i, c in enumerate(nlist):
+        if c == '[':
+            depth += 1
+        elif c == ']':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            groups.append(nlist[start:i])
+            start = i+1
+    groups.append(nlist[start:])
+    return groups
+
+def compress_nodelist(nodes, as_list=False) -> str:
+    """ inverse of expand_nodelist: translate a list (or space-separated 
+        string) of nodes like 'nid02516 nid02517 nid02518 nid02836' into a 
+        slurm-style nodelist, eg 'nid[02516-02518,02836]'
+    """
+    if isinstance(nodes, str):
+        nodes = nodes.split()
+    # group by prefix and width of the numeric part, in order of appearance:
+    groups = {}
+    for name in nodes:
+        prefix = name.rstrip('0123456789')
+        digits = name[len(prefix):]
+        groups.setdefault((prefix, len(digits)), set()).add(digits)
+    nlists = []
+    for (prefix, width), members in groups.items():
+        if width == 0:
+            nlists.append(prefix)
+            continue
+        nums = sorted(int(m) for m in members)
+        if len(nums) == 1:
+            nlists.append('{0:s}{1:0{2:d}d}'.format(prefix, nums[0], width))
+            continue
+        ranges = []
+        first = last = nums[0]
+        for i in nums[1:] + [None]:
+            if i is not None and i == last+1:
+                last = i
+                continue
+            if first == last:
+                ranges.append('{0:0{1:d}d}'.format(first, width))
+            else:
+                ranges.append('{0:0{2:d}d}-{1:0{2:d}d}'.format(first, last, width))
+            first = last = i
+        nlists.append('{0:s}[{1:s}]'.format(prefix, ','.join(ranges)))
+    if as_list:
+        return nlists
+    else:
+        return ','.join(nlists)
+
+
+# {dimension name: position or extent}
+DimsMap = dict
 
 class CrayXC:
     """ A Cray XC maps nodenames ("nid00123") to addresses (dicts 
@@ -159,8 +190,11 @@ class CrayXC:
             address = dict(withcol, **address)
         return self._cname_fmt.format(**address)
 
-    _re_address = re.compile('c(?P<col>\d+)-(?P<row>\d+)c(?P<cage>\d+)s(?P<slot>\d+)n(?P<node>\d+)')
+    _re_address = None  # compiled on first use
     def address_from_cname(self, cname: str) -> DimsMap:
+        if CrayXC._re_address is None:
+            import re
+            CrayXC._re_address = re.compile('c(?P<col>\d+)-(?P<row>\d+)c(?P<cage>\d+)s(?P<slot>\d+)n(?P<node>\d+)')
         match = self._re_address.search(cname)
         address = { dim: int(val) for dim,val in match.groupdict().items() }
         address['group'] = address['col'] // self.extents['group']
@@ -186,38 +220,11 @@ class CrayXC:
         return self.cname_from_address(addr)
 
     def nodename_from_cname(self, cname: str) -> str:
-        addr = self.address_from_cname(self, cname)
+        addr = self.address_from_cname(cname)
         return self.nodename_from_nid(self.nid_from_address(addr))
 
 
-import unittest
-import re
-class TestCrayXC(unittest.TestCase):
-    
-    def setUp(self):
-        self.cori = CrayXC(extents={'slot':4, 'cage':16, 'cab':3, 
-                                    'group':2, 'row':6, 'room':6})
-
-        # some corresponding nids and cnames:
-        self.names  =  [ 'nid00005',   'nid00103',   'nid00739',   'nid01522' ]
-        self.cnames =  [ 'c0-0c0s1n1', 'c0-0c1s9n3', 'c3-0c2s8n3', 'c7-0c2s12n2' ]
-        self.names +=  [ 'nid03400',   'nid06676',    'nid09472',   'nid10792' ]
-        self.cnames += [ 'c5-1c2s2n0', 'c10-2c2s5n0', 'c1-4c1s0n0', 'c8-4c0s10n0' ]
-        self.names +=  [ 'nid13055' ,   'nid00000' ]
-        self.cnames +=  [ 'c7-5c2s15n3', 'c0-0c0s0n0' ]
-        self.nids = [ int(n[3:]) for n in self.names ]
-
-    def test_address_from_nid(self):
-        for pair in zip(self.nids, self.cnames):
-            address = self.cori.address_from_nid(pair[0])
-            self.assertEqual(self.cori.cname_from_address(address), pair[1])
-
-    def test_nid_from_address(self):
-        for pair in zip(self.nids, self.cnames):
-            address = self.cori.address_from_cname(pair[1])
-            nid = self.cori.nid_from_address(address)
-            self.assertEqual(nid, pair[0])
-
-
 if __name__ == '__main__':
-    unittest.main()
+    # the tests live in test_slurm_utils.py:
+    import unittest
+    unittest.main(module='test_slurm_utils')
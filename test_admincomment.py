@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+# tests for admincomment.py, run with eg: python3 -m unittest test_admincomment
+
+import io
+import unittest
+from contextlib import redirect_stderr
+
+from admincomment import aggregate, get_field, main, parse_records, sacct_args
+
+
+class TestAdminComment(unittest.TestCase):
+
+    lines = [ '101|alice|proj1|{"stats":{"energy":100,"gpu":true},"ok":1}\n',
+              '102|alice|proj1|{"stats":{"energy":300}}\n',
+              '103|bob|proj2|{"stats":{"energy":50.5,"note":"a|b"}}\n',
+              '104|bob|proj2|\n',
+              '105|bob|proj2|{"stats":{"energy":\n',   # truncated
+              '106|bob|proj2|not json\n',
+              '107|bob|proj2|{"stats":{"energy":"n/a"}}\n' ]
+
+    def test_parse(self):
+        records = list(parse_records(self.lines))
+        self.assertEqual([ r[0] for r in records ], ['101', '102', '103', '107'])
+        self.assertEqual(records[2][3]['stats']['note'], 'a|b')
+        self.assertEqual(get_field(records[0][3], 'stats.energy'), 100)
+        self.assertIsNone(get_field(records[0][3], 'ok.nothere'))
+
+    def test_aggregate(self):
+        aggs = aggregate(parse_records(self.lines), ['stats.energy', 'stats.gpu'])
+        self.assertEqual(list(aggs), [('*', 'stats.energy')])
+        s = aggs[('*', 'stats.energy')].summary()
+        self.assertEqual((s['count'], s['sum'], s['min'], s['max']), (3, 450.5, 50.5, 300))
+        self.assertAlmostEqual(s['p50'], 100, delta=2)
+        aggs = aggregate(parse_records(self.lines), ['stats.energy'], group_by='user')
+        self.assertEqual(aggs[('alice', 'stats.energy')].summary()['mean'], 200)
+        self.assertEqual(aggs[('bob', 'stats.energy')].count, 1)
+
+    def test_sacct_args(self):
+        self.assertEqual(sacct_args('1,2', extra=['-r', 'debug'])[-4:],
+                         ['-j', '1,2', '-r', 'debug'])
+
+    def test_bad_percentiles(self):
+        # rejected before sacct is run:
+        for p in ('150', '-1', 'p90', 'nan', ','):
+            with redirect_stderr(io.StringIO()) as err:
+                self.assertEqual(main(['admincomment.py', '-f', 'stats.energy', '-p', p]), 2)
+            self.assertIn('usage', err.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+# tests for quantile_sketch.py, run with eg: python3 -m unittest test_quantile_sketch
+
+import unittest
+
+from quantile_sketch import QuantileSketch
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_quantiles(self):
+        sketch = QuantileSketch(alpha=0.02)
+        for v in range(1, 10001):
+            sketch.add(v)
+        for q in (0.1, 0.5, 0.9):
+            self.assertAlmostEqual(sketch.quantile(q), q*10000, delta=q*10000*0.03)
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+    def test_signs(self):
+        sketch = QuantileSketch(alpha=0.02)
+        for v in (-2.0, -1.0, 0, 0.25, 0.5):
+            sketch.add(v)
+        self.assertAlmostEqual(sketch.quantile(0), -2.0, delta=0.05)
+        self.assertEqual(sketch.quantile(0.5), 0.0)
+        self.assertAlmostEqual(sketch.quantile(0.75), 0.25, delta=0.01)
+        self.assertAlmostEqual(sketch.quantile(1), 0.5, delta=0.01)
+
+    def test_merge_and_roundtrip(self):
+        a, b = QuantileSketch(), QuantileSketch()
+        for v in range(0, 500):
+            a.add(v)
+        for v in range(500, 1000):
+            b.add(v)
+        b.add(-5)
+        a.merge(QuantileSketch.from_dict(b.to_dict()))
+        self.assertEqual(a.count, 1001)
+        self.assertAlmostEqual(a.quantile(0.5), 500, delta=15)
+
+
+if __name__ == '__main__':
+    unittest.main()
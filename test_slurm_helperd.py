@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# tests for slurm_helperd.py, run with eg: python3 -m unittest test_slurm_helperd
+
+import os
+import unittest
+
+from slurm_helperd import call, serve, Helper, ERR_FAILED, ERR_NOT_RUNNING
+
+
+class TestHelperd(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile
+        import threading
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'test.sock')
+        self.thread = threading.Thread(target=serve, args=(self.path,), daemon=True)
+        self.thread.start()
+        import time
+        for i in range(50):
+            if call('ping', path=self.path)[0] == 0:
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        import shutil
+        call('shutdown', path=self.path)
+        self.thread.join(5)
+        shutil.rmtree(self.tmpdir)
+
+    def test_nodelists(self):
+        status, text = call('expand', ['nid00[187-188]'], path=self.path)
+        self.assertEqual((status, text), (0, 'nid00187\nnid00188\n'))
+        status, text = call('expand', ['nid00001,nid00002', 'login[01-02],nid00003'], path=self.path)
+        self.assertEqual((status, text), (0, 'nid00001\nnid00002\nlogin01\nlogin02\nnid00003\n'))
+        status, text = call('compress', ['nid00188', 'nid00187'], path=self.path)
+        self.assertEqual((status, text), (0, 'nid[00187-00188]\n'))
+        status, text = call('compress', ['nid[00187-00188],nid00190', 'nid00189'], path=self.path)
+        self.assertEqual((status, text), (0, 'nid[00187-00190]\n'))
+        status, text = call('cname', ['nid06676'], path=self.path)
+        self.assertEqual((status, text), (0, 'c10-2c2s5n0\n'))
+
+    def test_errors(self):
+        self.assertEqual(call('bogus', path=self.path)[0], ERR_FAILED)
+        missing = os.path.join(self.tmpdir, 'missing.sock')
+        self.assertEqual(call('ping', path=missing)[0], ERR_NOT_RUNNING)
+
+
+class TestHelperCache(unittest.TestCase):
+
+    def test_expiry(self):
+        import time
+        helper = Helper(ttl=0.05)
+        self.assertEqual(helper._cached('a', lambda: 1), 1)
+        # still fresh, so not fetched again:
+        self.assertEqual(helper._cached('a', lambda: 2), 1)
+        time.sleep(0.1)
+        # adding another entry drops the expired one and its lock:
+        helper._cached('b', lambda: 3)
+        self.assertEqual(list(helper._cache), ['b'])
+        self.assertEqual(list(helper._locks), ['b'])
+        # as does a failed fetch:
+        with self.assertRaises(ZeroDivisionError):
+            helper._cached('c', lambda: 1/0)
+        helper._cached('d', lambda: 4)
+        self.assertNotIn('c', helper._locks)
+
+    def test_env(self):
+        import shutil
+        import tempfile
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        fake = os.path.join(tmpdir, 'squeue')
+        with open(fake, 'w') as f:
+            f.write('#!/bin/sh\necho "clusters=$SLURM_CLUSTERS"\n')
+        os.chmod(fake, 0o755)
+        from unittest import mock
+        # the daemon's own slurm environment doesn't leak into requests:
+        with mock.patch.dict(os.environ, { 'PATH': tmpdir + os.pathsep + os.environ['PATH'],
+                                           'SLURM_CLUSTERS': 'daemon' }):
+            helper = Helper()
+            self.assertEqual(helper.run('squeue', [], {}), 'clusters=\n')
+            # and requests from different environments aren't mixed up:
+            self.assertEqual(helper.run('squeue', [], {'SLURM_CLUSTERS': 'other'}),
+                             'clusters=other\n')
+            self.assertEqual(helper.run('squeue', [], {}), 'clusters=\n')
+
+    def test_reservations_traced(self):
+        import shutil
+        import tempfile
+        from unittest import mock
+        import slurm_trace
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        fake = os.path.join(tmpdir, 'scontrol')
+        with open(fake, 'w') as f:
+            f.write('#!/bin/sh\necho "ReservationName=myres Nodes=nid[00001-00002]"\n')
+        os.chmod(fake, 0o755)
+        with mock.patch.dict(os.environ, { 'PATH': tmpdir + os.pathsep + os.environ['PATH'] }), \
+             mock.patch.object(slurm_trace, '_trace_to', os.path.join(tmpdir, 'trace.jsonl')), \
+             mock.patch.object(slurm_trace, '_records', []):
+            self.assertEqual(Helper().run('res_nodelist', ['myres']), 'nid00001\nnid00002\n')
+            # the reservation parse is traced as such:
+            self.assertEqual(slurm_trace._records[-1]['records'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
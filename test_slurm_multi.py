@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+# tests for slurm_multi.py, run with eg: python3 -m unittest test_slurm_multi
+
+import os
+import subprocess
+import unittest
+
+from slurm_multi import cluster_args, fanout, main
+
+
+class TestFanout(unittest.TestCase):
+    """ runs a fake squeue that is slow for cluster "slow" """
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp()
+        fake = os.path.join(self.tmpdir, 'squeue')
+        with open(fake, 'w') as f:
+            f.write('#!/bin/sh\n'
+                    '[ "$2" = slow ] && exec sleep 5\n'
+                    'echo "CLUSTER: $2"\necho JOBID\necho "$2-101"\n')
+        os.chmod(fake, 0o755)
+        self.env = dict(os.environ, PATH=self.tmpdir + os.pathsep + os.environ['PATH'])
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmpdir)
+
+    def test_cluster_args(self):
+        self.assertEqual(cluster_args(['squeue', '-u', 'me'], 'c1'),
+                         ['squeue', '-M', 'c1', '-u', 'me'])
+
+    def test_fanout(self):
+        import time
+        t0 = time.time()
+        results = list(fanout(['squeue'], ['slow', 'c1', 'c2'], timeout=0.5,
+                              env=self.env, parse=lambda out: out.split()))
+        self.assertLess(time.time() - t0, 4)
+        # the slow cluster times out, and finishes last:
+        self.assertEqual(results[-1][0], 'slow')
+        self.assertIsInstance(results[-1][2], subprocess.TimeoutExpired)
+        done = dict((c, out) for c, out, err in results[:-1])
+        self.assertEqual(done, {'c1': ['JOBID', 'c1-101'], 'c2': ['JOBID', 'c2-101']})
+
+
+    def test_parse_error(self):
+        def parse(out):
+            if 'c1' in out:
+                raise ValueError("bad output")
+            return out.split()
+        results = sorted(fanout(['squeue'], ['c1', 'c2'], env=self.env, parse=parse))
+        # a failed parse is reported for that cluster only:
+        self.assertEqual(results[0][0], 'c1')
+        self.assertIsInstance(results[0][2], ValueError)
+        self.assertEqual(results[1], ('c2', ['JOBID', 'c2-101'], None))
+
+    def test_bad_options(self):
+        import io
+        from contextlib import redirect_stderr
+        for opts in (['-t', 'soon'], ['-j', '1.5'], ['-j', '0']):
+            with redirect_stderr(io.StringIO()) as err:
+                self.assertEqual(main(['slurm_multi.py', '-M', 'c1'] + opts + ['squeue']), 2)
+            self.assertIn('usage', err.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
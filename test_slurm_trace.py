@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+# tests for slurm_trace.py, run with eg: python3 -m unittest test_slurm_trace
+
+import os
+import subprocess
+import unittest
+
+import slurm_trace
+
+
+class TestTrace(unittest.TestCase):
+    """ runs a fake squeue from a temporary directory on PATH """
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp()
+        fake = os.path.join(self.tmpdir, 'squeue')
+        with open(fake, 'w') as f:
+            f.write('#!/bin/sh\necho JOBID\necho 101\necho 102\n')
+        os.chmod(fake, 0o755)
+        self.env = dict(os.environ, PATH=self.tmpdir + os.pathsep + os.environ['PATH'])
+        self.saved = slurm_trace._trace_to
+        slurm_trace._trace_to = os.path.join(self.tmpdir, 'trace.jsonl')
+        del slurm_trace._records[:]
+
+    def tearDown(self):
+        import shutil
+        slurm_trace._trace_to = self.saved
+        del slurm_trace._records[:]
+        shutil.rmtree(self.tmpdir)
+
+    def test_trace(self):
+        import json
+        jobs = slurm_trace.run(['squeue'], env=self.env, parse=lambda out: out.split()[1:])
+        self.assertEqual(jobs, ['101', '102'])
+        self.assertEqual(slurm_trace.run(['squeue'], env=self.env), 'JOBID\n101\n102\n')
+        with open(slurm_trace._trace_to) as f:
+            records = [ json.loads(line) for line in f ]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['cmd'], 'squeue')
+        self.assertEqual(records[0]['bytes'], 14)
+        self.assertEqual(records[0]['records'], 2)
+        self.assertEqual(records[1]['records'], 3)
+        self.assertEqual(records[1]['rc'], 0)
+        import io
+        table = io.StringIO()
+        slurm_trace.summary(table)
+        self.assertIn('squeue', table.getvalue())
+
+    def test_stream(self):
+        lines = list(slurm_trace.stream(['squeue'], env=self.env))
+        self.assertEqual(lines, ['JOBID\n', '101\n', '102\n'])
+        self.assertEqual(slurm_trace._records[-1]['records'], 3)
+        self.assertEqual(slurm_trace._records[-1]['bytes'], 14)
+
+    def test_disabled(self):
+        slurm_trace._trace_to = None
+        self.assertEqual(slurm_trace.run(['squeue'], env=self.env), 'JOBID\n101\n102\n')
+        self.assertEqual(slurm_trace._records, [])
+
+    def test_failure(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            slurm_trace.run(['false'], env=self.env)
+        self.assertEqual(slurm_trace._records[-1]['cmd'], 'false')
+        self.assertEqual(slurm_trace._records[-1]['rc'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# tests for slurm_utils.py, run with eg: python3 -m unittest test_slurm_utils
+
+import unittest
+
+from slurm_utils import expand_nodelist, compress_nodelist, CrayXC
+
+
+class TestExpandNodelist(unittest.TestCase):
+
+    def test_expandnodelist(self):
+        # slightly arbitrary list of test cases:
+        nlist = 'nid02085'
+        self.assertEqual(expand_nodelist(nlist), 'nid02085')
+        nlist = 'nid00[200,222]'
+        self.assertEqual(expand_nodelist(nlist), 'nid00200 nid00222')
+        nlist = 'nid00[187-188]'
+        self.assertEqual(expand_nodelist(nlist), 'nid00187 nid00188')
+        nlist = 'nid00[189-191,193-195,200-203,208-229]'
+        self.assertEqual(len(expand_nodelist(nlist).split()), 32)
+        nlist = 'nid0[1299-1306,1309-1315,1317,1319-1334]'
+        self.assertEqual(len(expand_nodelist(nlist).split()), 32)
+        nlist = 'nid[10436-10439,10441-10443,10448-10452,10454-10511,10516-10535]'
+        self.assertEqual(len(expand_nodelist(nlist).split()), 90)
+        # several groups, like "scontrol show hostnames":
+        nlist = 'nid00001,nid00002'
+        self.assertEqual(expand_nodelist(nlist), 'nid00001 nid00002')
+        nlist = 'nid[00001-00002],login01,dtn[3,5]'
+        self.assertEqual(expand_nodelist(nlist, as_list=True),
+                         ['nid00001', 'nid00002', 'login01', 'dtn3', 'dtn5'])
+        # incomplete nodelist should throw an exception:
+        nlist = 'nid[07575,08812,09507,09637,09946,10361,10436,109'
+        with self.assertRaises(Exception):
+            expand_nodelist(nlist)
+
+    def test_compressnodelist(self):
+        self.assertEqual(compress_nodelist('nid02085'), 'nid02085')
+        self.assertEqual(compress_nodelist('nid00222 nid00200'), 'nid[00200,00222]')
+        # like slurm, the compressed form puts all digits inside the brackets:
+        nlist = 'nid0[1299-1306,1309-1315,1317,1319-1334]'
+        self.assertEqual(compress_nodelist(expand_nodelist(nlist)), 
+                         'nid[01299-01306,01309-01315,01317,01319-01334]')
+        nlist = 'nid[10436-10439,10441-10443,10448-10452,10454-10511,10516-10535]'
+        nodes = expand_nodelist(nlist, as_list=True)
+        self.assertEqual(compress_nodelist(nodes[::-1]), nlist)
+        self.assertEqual(compress_nodelist(['login1', 'nid00001', 'login2']), 
+                         'login[1-2],nid00001')
+
+
+class TestCrayXC(unittest.TestCase):
+
+    def setUp(self):
+        self.cori = CrayXC(extents={'slot':4, 'cage':16, 'cab':3, 
+                                    'group':2, 'row':6, 'room':6})
+
+        # some corresponding nids and cnames:
+        self.names  =  [ 'nid00005',   'nid00103',   'nid00739',   'nid01522' ]
+        self.cnames =  [ 'c0-0c0s1n1', 'c0-0c1s9n3', 'c3-0c2s8n3', 'c7-0c2s12n2' ]
+        self.names +=  [ 'nid03400',   'nid06676',    'nid09472',   'nid10792' ]
+        self.cnames += [ 'c5-1c2s2n0', 'c10-2c2s5n0', 'c1-4c1s0n0', 'c8-4c0s10n0' ]
+        self.names +=  [ 'nid13055' ,   'nid00000' ]
+        self.cnames +=  [ 'c7-5c2s15n3', 'c0-0c0s0n0' ]
+        self.nids = [ int(n[3:]) for n in self.names ]
+
+    def test_address_from_nid(self):
+        for pair in zip(self.nids, self.cnames):
+            address = self.cori.address_from_nid(pair[0])
+            self.assertEqual(self.cori.cname_from_address(address), pair[1])
+
+    def test_nid_from_address(self):
+        for pair in zip(self.nids, self.cnames):
+            address = self.cori.address_from_cname(pair[1])
+            nid = self.cori.nid_from_address(address)
+            self.assertEqual(nid, pair[0])
+
+    def test_nodename_from_cname(self):
+        for name,cname in zip(self.names, self.cnames):
+            self.assertEqual(self.cori.nodename_from_cname(cname), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+# tests for waittime.py, run with eg: python3 -m unittest test_waittime
+
+import os
+import unittest
+
+from waittime import WaitTimes, annotate, main, node_class
+
+
+class TestWaitTimes(unittest.TestCase):
+
+    def setUp(self):
+        import tempfile
+        self.tmpdir = tempfile.mkdtemp()
+        # fake sacct: two regular jobs (1 and 4 nodes), one debug job, one
+        # not yet started
+        fake = os.path.join(self.tmpdir, 'sacct')
+        with open(fake, 'w') as f:
+            f.write('#!/bin/sh\n'
+                    'echo "1|1000|1000|1600|regular|normal|1"\n'
+                    'echo "2|1000|1200|4800|regular|normal|4"\n'
+                    'echo "3|2000|2000|2060|debug|normal|1"\n'
+                    'echo "4|3000|3000|Unknown|regular|normal|1"\n')
+        os.chmod(fake, 0o755)
+        self.path = os.environ.get('PATH')
+        os.environ['PATH'] = self.tmpdir + os.pathsep + self.path
+
+    def tearDown(self):
+        import shutil
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.tmpdir)
+
+    def test_node_class(self):
+        self.assertEqual([ node_class(n) for n in (1, 2, 3, 4, 5, 128) ],
+                         [1, 2, 4, 4, 8, 128])
+
+    def test_update(self):
+        wt = WaitTimes()
+        self.assertEqual(wt.update(), 3)
+        self.assertEqual(wt.watermark, 4800)
+        p50, p90 = wt.lookup('regular', 'normal', 3)
+        self.assertAlmostEqual(p50, 3600, delta=3600*0.02)
+        # a second update only adds jobs started since the last one:
+        self.assertEqual(wt.update(), 0)
+        path = os.path.join(self.tmpdir, 'waittime.json')
+        wt.save(path)
+        wt2 = WaitTimes.load(path, estimates_only=True)
+        self.assertEqual(wt2.lookup('debug', 'normal', 1), wt.lookup('debug', 'normal', 1))
+        self.assertIsNone(wt2.lookup('debug', 'normal', 2))
+
+    def test_late_records(self):
+        wt = WaitTimes()
+        self.assertEqual(wt.add_records([ '1|1000|1000|4800|regular|normal|1\n' ]), 1)
+        # the next sacct output overlaps the last, and has a job that started
+        # earlier but was only recorded since:
+        self.assertEqual(wt.add_records([ '2|1000|1000|4700|regular|normal|1\n',
+                                          '1|1000|1000|4800|regular|normal|1\n',
+                                          '3|1000|1000|4800|regular|normal|1\n' ]), 2)
+        self.assertEqual((wt.watermark, wt.recent), (4800, {'1': 4800, '2': 4700, '3': 4800}))
+        # jobs older than the overlap are dropped, from the output and the
+        # remembered JobIDs:
+        self.assertEqual(wt.add_records([ '3|1000|1000|4800|regular|normal|1\n',
+                                          '4|1000|1000|2900|regular|normal|1\n',
+                                          '5|1000|1000|6550|regular|normal|1\n' ]), 1)
+        self.assertEqual((wt.watermark, wt.recent), (6550, {'1': 4800, '3': 4800, '5': 6550}))
+        path = os.path.join(self.tmpdir, 'waittime.json')
+        wt.save(path)
+        self.assertEqual(WaitTimes.load(path).recent, wt.recent)
+
+    def test_annotate(self):
+        wt = WaitTimes()
+        wt.update()
+        # qos and partition truncated like squeue does:
+        lines = [ 'JOBID ST QOS PARTITION SUBMIT START NODES\n',
+                  '  101 PD norm regul   10000 N/A  1\n',
+                  '  102 PD norm regul   10000 1700000000  1\n',
+                  '  103 R  norm regul   10000 N/A  1\n',
+                  '  104 PD norm premium 10000 N/A  1\n',
+                  '  105 PD norm regul   9000  N/A  1\n' ]
+        out = list(annotate(lines, wt, state=2, qos=3, partition=4, nnodes=7, submit=5,
+                            start=6, qos_width=4, partition_width=5, now=10060))
+        # the predicted wait less the minute already queued:
+        self.assertEqual(out[1], '  101 PD norm regul   10000 ~9m/9m  1\n')
+        # slurm's own estimate, running jobs, unknown classes and jobs that
+        # have waited longer than p90 are left alone:
+        self.assertEqual(out[0], lines[0])
+        self.assertEqual(out[2:], lines[2:])
+
+    def test_annotate_prefix(self):
+        wt = WaitTimes()
+        wt.estimates = { 'regular_ss11/normal/1': [7200, 7200],
+                         'regular/normal/1': [600, 600],
+                         'regular_ss10/normal/1': [60, 60] }
+        lines = [ 'JOBID ST QOS PARTITION SUBMIT START NODES\n',
+                  '  101 PD normal regular 10000 N/A 1\n',
+                  '  102 PD normal regular_ss1 10000 N/A 1\n',
+                  '  103 PD normal regular_ss11 10000 N/A 1\n',
+                  '  104 PD normal regul 10000 N/A 1\n' ]
+        out = list(annotate(lines, wt, state=2, qos=3, partition=4, nnodes=7, submit=5,
+                            start=6, partition_width=11, now=10000))
+        # an exact match wins over a longer name with the same prefix:
+        self.assertEqual(out[1], '  101 PD normal regular 10000 ~10m/10m 1\n')
+        # a name filling the column is truncated, but here it is ambiguous:
+        self.assertEqual(out[2], lines[2])
+        self.assertEqual(out[3], '  103 PD normal regular_ss11 10000 ~2.0h/2.0h 1\n')
+        # and a shorter name isn't truncated, so is not a prefix:
+        self.assertEqual(out[4], lines[4])
+
+    def test_annotate_bad_file(self):
+        import io
+        from contextlib import redirect_stderr, redirect_stdout
+        from unittest import mock
+        path = os.path.join(self.tmpdir, 'waittime.json')
+        lines = 'JOBID ST QOS PARTITION START NODES\n  101 PD normal regular N/A 1\n'
+        for content in ('{bad', '{}', None):
+            if content is not None:
+                with open(path, 'w') as f:
+                    f.write(content)
+            elif os.path.exists(path):
+                os.unlink(path)
+            out = io.StringIO()
+            with mock.patch.dict(os.environ, { 'SLURM_WAITTIME_FILE': path }), \
+                 mock.patch('sys.stdin', io.StringIO(lines)), \
+                 redirect_stdout(out), redirect_stderr(io.StringIO()):
+                self.assertEqual(main(['waittime.py', 'annotate']), 0)
+            # the queue is passed through unchanged:
+            self.assertEqual(out.getvalue(), lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
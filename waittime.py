@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+# predicted queue wait times, for myq
+#
+# Historical wait times (Start - Eligible, or Start - Submit for jobs without
+# an Eligible time) from sacct are streamed into small quantile sketches
+# (quantile_sketch.QuantileSketch), one per partition/QOS/node-count class,
+# and saved along with precomputed p50 and p90 for each class. Subsequent
+# updates only ask sacct for jobs that started since the last one (less a
+# margin for jobs that slurmdbd records late), and merge the new ones into
+# the existing sketches. myq then looks up each pending job's class
+# in the saved quantiles, so it never needs to look at the history itself.
+#
+# usage:
+#   waittime.py update [-d days]     add jobs started since the last update
+#                                    (or in the last <days>, default 14)
+#   waittime.py show                 print p50/p90 wait for each class
+#   waittime.py annotate [options]   filter squeue output, replacing the start
+#                                    time of pending jobs with "~p50/p90" of
+#                                    their remaining wait
+#
+# the sketches live in $SLURM_WAITTIME_FILE, default
+# ~/.cache/slurm-helpers/waittime.json
+
+import os
+import sys
+
+import slurm_trace
+from quantile_sketch import QuantileSketch
+
+
+def default_path():
+    path = os.environ.get('SLURM_WAITTIME_FILE')
+    if not path:
+        cache = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        path = os.path.join(cache, 'slurm-helpers', 'waittime.json')
+    return path
+
+
+def node_class(nnodes):
+    """ node counts are bucketed by the next power of 2, ie 1, 2, 3-4, 5-8.. """
+    return 1 << (max(1, int(nnodes)) - 1).bit_length()
+
+
+def class_key(partition, qos, nnodes):
+    return '{}/{}/{}'.format(partition, qos, node_class(nnodes))
+
+
+class WaitTimes:
+    """ the per-class sketches, plus their precomputed quantiles and the
+        latest start time seen. slurmdbd can record jobs some time after they
+        start, so updates ask sacct for jobs started up to overlap seconds
+        before that, and skip the ones already added
+    """
+    quantiles = (0.5, 0.9)
+    overlap = 1800
+
+    def __init__(self, alpha=0.02):
+        self.alpha = alpha
+        self.sketches = {}    # class_key: QuantileSketch
+        self.estimates = {}   # class_key: [p50, p90]
+        self.watermark = 0
+        self.recent = {}      # JobID: start, of jobs added within overlap of the watermark
+
+    def add_records(self, lines):
+        """ add sacct -P records of JobID|Submit|Eligible|Start|Partition|QOS|NNodes
+            (times as unix timestamps). Returns the number of jobs added
+        """
+        added = 0
+        max_start = self.watermark
+        oldest = self.watermark - self.overlap
+        for line in lines:
+            fields = line.rstrip('\n').split('|')
+            if len(fields) < 7:
+                continue
+            jobid, submit, eligible, start, partition, qos, nnodes = fields[:7]
+            # jobs that haven't started yet have Start "Unknown" or "None":
+            if not start.isdigit() or not nnodes.isdigit():
+                continue
+            start = int(start)
+            if start < oldest or jobid in self.recent:
+                continue
+            self.recent[jobid] = start
+            max_start = max(max_start, start)
+            since = int(eligible) if eligible.isdigit() else int(submit)
+            key = class_key(partition, qos, nnodes)
+            sketch = self.sketches.get(key)
+            if sketch is None:
+                sketch = self.sketches[key] = QuantileSketch(self.alpha)
+            sketch.add(max(0, start - since))
+            added += 1
+        # only move the watermark once the whole batch is in:
+        self.watermark = max_start
+        self.recent = { j: t for j, t in self.recent.items() if t >= max_start - self.overlap }
+        return added
+
+    def update(self, days=14):
+        """ stream jobs started since the last update (or in the last <days>)
+            from sacct into the sketches
+        """
+        import time
+        since = self.watermark - self.overlap if self.watermark else time.time() - days*86400
+        args = ['sacct', '-a', '-X', '-n', '-P', '--noconvert',
+                '-o', 'JobID,Submit,Eligible,Start,Partition,QOS,NNodes',
+                '-S', time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(since)),
+                '-E', 'now']
+        env = dict(os.environ, SLURM_TIME_FORMAT='%s')
+        added = self.add_records(slurm_trace.stream(args, env=env))
+        self._estimate()
+        return added
+
+    def _estimate(self):
+        self.estimates = { key: [ sketch.quantile(q) for q in self.quantiles ]
+                           for key, sketch in self.sketches.items() }
+
+    def lookup(self, partition, qos, nnodes):
+        """ [p50, p90] wait in seconds for this class, or None """
+        return self.estimates.get(class_key(partition, qos, nnodes))
+
+    def save(self, path=None):
+        import json
+        path = path or default_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        d = { 'alpha': self.alpha, 'watermark': self.watermark,
+              'recent': self.recent,
+              'estimates': self.estimates,
+              'sketches': { k: s.to_dict() for k, s in self.sketches.items() } }
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(d, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=None, estimates_only=False):
+        """ load saved sketches, or return an empty WaitTimes if there are
+            none. estimates_only skips rebuilding the sketches, for lookups
+        """
+        import json
+        path = path or default_path()
+        try:
+            with open(path) as f:
+                d = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        wt = cls(d['alpha'])
+        wt.watermark = d['watermark']
+        wt.recent = d.get('recent', {})
+        wt.estimates = d['estimates']
+        if not estimates_only:
+            wt.sketches = { k: QuantileSketch.from_dict(s) for k, s in d['sketches'].items() }
+        return wt
+
+
+def fmt_wait(sec):
+    """ short human-readable duration, eg 45m, 3.2h, 1.5d """
+    if round(sec/60) < 60:
+        return '{:d}m'.format(int(round(sec/60)))
+    elif sec < 86400:
+        return '{:.1f}h'.format(sec/3600)
+    return '{:.1f}d'.format(sec/86400)
+
+
+def annotate(lines, wt, state=2, qos=3, partition=4, nnodes=8, submit=12, start=13,
+             qos_width=8, partition_width=10, now=None):
+    """ generator over squeue output lines, replacing the start time field of
+        pending jobs without a slurm estimate with "~p50/p90" of the wait
+        still to come, ie less the time since submission (submit times are
+        unix timestamps). Jobs that have already waited longer than p90 are
+        left alone. Field numbers are 1-based, matching awk, and the
+        defaults match "myq -l". squeue truncates qos and partition names to
+        the column width, so a name that fills its column is matched by
+        prefix against the known classes, if exactly one class matches
+    """
+    import re
+    classes = set(tuple(key.split('/')[:2]) for key in wt.estimates)
+    resolved = {}   # (partition, qos) as shown: (full partition, full qos) or None
+    def matches(shown, name, width):
+        return name == shown or (len(shown) >= width and name.startswith(shown))
+    def resolve(part, q):
+        if (part, q) not in resolved:
+            if (part, q) in classes:
+                resolved[(part, q)] = (part, q)
+            else:
+                found = [ c for c in classes if matches(part, c[0], partition_width)
+                                            and matches(q, c[1], qos_width) ]
+                resolved[(part, q)] = found[0] if len(found) == 1 else None
+        return resolved[(part, q)]
+
+    if now is None:
+        import time
+        now = time.time()
+    for i, line in enumerate(lines):
+        spans = [ m.span() for m in re.finditer(r'\S+', line) ]
+        if i > 0 and len(spans) >= max(state, qos, partition, nnodes, submit, start):
+            field = lambda n: line[spans[n-1][0]:spans[n-1][1]]
+            if field(state) == 'PD' and not field(start).isdigit() and field(nnodes).isdigit():
+                cls = resolve(field(partition), field(qos))
+                est = cls and wt.lookup(*cls, nnodes=field(nnodes))
+                if est and field(submit).isdigit():
+                    # the history is of whole waits, so take off the time
+                    # already queued:
+                    waited = now - int(field(submit))
+                    est = [ max(0, e - waited) for e in est ]
+                if est and est[-1] > 0:
+                    a, b = spans[start-1]
+                    line = line[:a] + '~{}/{}'.format(*map(fmt_wait, est)) + line[b:]
+        yield line
+
+
+def main(argv):
+    import getopt
+    usage = ("usage: {} update [-d days] | show | annotate [--state N --qos N --partition N"
+             " --nodes N --submit N --start N --qos-width N --partition-width N]".format(argv[0]))
+    if len(argv) < 2:
+        print(usage, file=sys.stderr)
+        return 2
+    action = argv[1]
+    try:
+        opts, args = getopt.getopt(argv[2:], 'd:', ['state=', 'qos=', 'partition=', 'nodes=', 'submit=', 'start=',
+                                                     'qos-width=', 'partition-width='])
+    except getopt.GetoptError:
+        print(usage, file=sys.stderr)
+        return 2
+    opts = dict(opts)
+    if action == 'update':
+        wt = WaitTimes.load()
+        added = wt.update(days=float(opts.get('-d', 14)))
+        wt.save()
+        print("added {:d} jobs".format(added))
+    elif action == 'show':
+        wt = WaitTimes.load(estimates_only=True)
+        for key in sorted(wt.estimates):
+            print('{:<40s} {:>8s} {:>8s}'.format(key, *map(fmt_wait, wt.estimates[key])))
+    elif action == 'annotate':
+        # myq's output goes through this, so never lose it over a bad file:
+        try:
+            wt = WaitTimes.load(estimates_only=True)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print("ignoring saved wait times: {}".format(e), file=sys.stderr)
+            wt = WaitTimes()
+        fields = { k: int(opts['--'+k]) for k in ('state', 'qos', 'partition', 'submit', 'start') if '--'+k in opts }
+        if '--nodes' in opts:
+            fields['nnodes'] = int(opts['--nodes'])
+        for k in ('qos', 'partition'):
+            if '--{}-width'.format(k) in opts:
+                fields[k + '_width'] = int(opts['--{}-width'.format(k)])
+        for line in annotate(sys.stdin, wt, **fields):
+            sys.stdout.write(line)
+    else:
+        print(usage, file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
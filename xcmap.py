@@ -426,24 +426,28 @@ def parse_nodelist(nlist_as_text):
 
 from time import ctime
 import getopt
-import subprocess
 import os
 def main(stdscr):
 
     # reports to generate:
     # my immediate need is to look at nodes in a reservation
     usage = "show info on a cluster map"
-    usage += sys.argv[0] + "-r res "
+    usage += sys.argv[0] + "-r res -M cluster "
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'r:', ['res'])
+        opts, args = getopt.getopt(sys.argv[1:], 'r:M:', ['res', 'cluster'])
     except getopt.GetoptError:
         print(usage)
         sys.exit(2)
 
     res = None
+    machine = None   # slurm cluster to query, default is the local one
     for opt in opts:
         if opt[0] in ('-r', '--res'):
             res = opt[1]
+        elif opt[0] in ('-M', '--cluster') and ',' not in opt[1]:
+            # one map shows one machine, so only a single cluster makes sense
+            # here (slurm_multi.py can query several at once)
+            machine = opt[1]
         else:
             print(usage)
             sys.exit(2)
@@ -453,37 +457,39 @@ def main(stdscr):
     # start simple with specifics I want: which nodes is a reservation for?
     # bottom layer is nodes-by-type/state: . for down, + for hsw and * for knl
     # layer above is a highlight on nodes for the reservation
-    import subprocess
-    scontrol = subprocess.Popen('scontrol -a -o show node'.split(), stdout=subprocess.PIPE)
-    nodereport,err = scontrol.communicate()
+    import slurm_trace
+    def scontrol(args):
+        return ['scontrol'] + (['-M', machine] if machine else []) + args
     report = {} # nid: char, attr_tag ('N' for normal or 'H' for highlight) 
     field_re = re.compile('(?:\A| )(?:\w+)=')
-    for node in nodereport.splitlines():
-      try:
-        # fields are like "nodename=abcde" .. but the value can contain spaces or '='
-        # characters, so we need to carefully parse the line:
-        keys = [ k[:-1].strip() for k in field_re.findall(node) ]
-        values = field_re.split(node)[1:]
-        d = dict(zip(keys,values))
-        # Handle spaces in optional final field "Reason" (for eg DOWN state):
-        #d = dict(f.split('=',1) for f in node.partition(' Reason=')[0].split())
-        nid = int(d['NodeName'].lstrip('nid'))
-        if d['State'].startswith('D'):
-            rep = '.'
-        elif 'knl' in d.get('ActiveFeatures',''):
-            rep = '*'
-        else:
-            rep = '+'
-        report[nid] = [ rep, 'N' ]
-      except:
-        print("error parsing: \n" + node, file=sys.stderr)
-        raise
+    def parse_nodes(nodereport):
+      for node in nodereport.splitlines():
+        try:
+          # fields are like "nodename=abcde" .. but the value can contain spaces or '='
+          # characters, so we need to carefully parse the line:
+          keys = [ k[:-1].strip() for k in field_re.findall(node) ]
+          values = field_re.split(node)[1:]
+          d = dict(zip(keys,values))
+          # Handle spaces in optional final field "Reason" (for eg DOWN state):
+          #d = dict(f.split('=',1) for f in node.partition(' Reason=')[0].split())
+          nid = int(d['NodeName'].lstrip('nid'))
+          if d['State'].startswith('D'):
+              rep = '.'
+          elif 'knl' in d.get('ActiveFeatures',''):
+              rep = '*'
+          else:
+              rep = '+'
+          report[nid] = [ rep, 'N' ]
+        except:
+          print("error parsing: \n" + node, file=sys.stderr)
+          raise
+      return report
+    slurm_trace.run(scontrol('-a -o show node'.split()), parse=parse_nodes)
     if res:
-        cmd = 'scontrol -a -o show res'.split()
+        cmd = scontrol('-a -o show res'.split())
         cmd.append(res)
-        scontrol = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-        resreport,err = scontrol.communicate()
-        d = dict(f.split('=',1) for f in resreport.split())
+        d = slurm_trace.run(cmd, parse=lambda resreport: 
+                                dict(f.split('=',1) for f in resreport.split()))
         for n in parse_nodelist(d['Nodes']):
             nid = int(n.lstrip('nid'))
             #debug("got nid {0:d} from {1:s}".format(nid,n))
@@ -492,7 +498,7 @@ def main(stdscr):
    
     # --- end hacky code ---
 
-    if os.getenv("NERSC_HOST") == 'edison':
+    if (machine or os.getenv("NERSC_HOST")) == 'edison':
         cluster = Cluster([4, 16, 3, 2, 4, 4, 16])
     else:  # cori
         cluster = Cluster([4, 16, 3, 2, 6, 6, 34])